@@ -1,11 +1,16 @@
 import streamlit as st
 import requests
 import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote as _urlquote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # === 🔐 GitLab Setup ===
 API_TOKEN = st.secrets["GITLAB_API_TOKEN"]
 GITLAB_URL = "https://code.swecha.org"
 API_URL = f"{GITLAB_URL}/api/v4"
+GRAPHQL_URL = f"{GITLAB_URL}/api/graphql"
 REQUIRED_FILES = [
     "README.md",
     "CONTRIBUTING.md",
@@ -31,146 +36,251 @@ MR_TEMPLATE_PATTERNS = [
     r"mergerequesttemplate.*\.md$",
     r"mergerequesttemplates.*\.md$"
 ]
+# Each pattern list compiled once into a single alternation
+ISSUE_RE = re.compile("|".join(f"(?:{p})" for p in ISSUE_TEMPLATE_PATTERNS), re.IGNORECASE)
+MR_RE = re.compile("|".join(f"(?:{p})" for p in MR_TEMPLATE_PATTERNS), re.IGNORECASE)
+# Status keys shown under "Required Files"
+FILE_SET = set(REQUIRED_FILES) | {"CHANGELOG.md"}
+# Everything the compliance check needs, fetched in one GraphQL round-trip:
+# project metadata, which of the candidate root files exist, and the .gitlab/ tree
+COMPLIANCE_QUERY = """
+query($fullPath: ID!, $paths: [String!]!) {
+  project(fullPath: $fullPath) {
+    description
+    topics
+    repository {
+      files: blobs(paths: $paths) { nodes { path } }
+      templates: tree(path: ".gitlab", recursive: true) {
+        blobs { nodes { path } }
+      }
+    }
+  }
+}
+"""
+
+# === 🌐 HTTP Session ===
+@st.cache_resource
+def get_session():
+    """
+    Shared session for all GitLab calls so keep-alive connections are reused
+    instead of paying a new TCP+TLS handshake per request
+    """
+    session = requests.Session()
+    session.headers.update({"PRIVATE-TOKEN": API_TOKEN})
+    # raise_on_status=False hands the final 5xx response back to the callers'
+    # status_code checks instead of raising RetryError once retries run out
+    retries = Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries)
+    session.mount("https://", adapter)
+    return session
+
+SESSION = get_session()
+REQUEST_TIMEOUT = 10
+# Worker threads for concurrent API probes (kept below the adapter's pool_maxsize)
+MAX_WORKERS = 8
+# Conventional branches probed when the default branch does not have a file
+BRANCHES = ['master', 'main']
+# Seconds a cached API answer stays valid before GitLab is asked again
+CACHE_TTL = 300
+# Project lookups change rarely, so they are kept longer across reruns
+PROJECT_CACHE_TTL = 600
 
 # === Helper Functions ===
-def get_headers():
-    return {"PRIVATE-TOKEN": API_TOKEN}
+class GitLabAPIError(Exception):
+    """
+    GitLab gave no definitive answer (network error, rate limit, 5xx)
+    Raised from cached helpers because st.cache_data does not cache exceptions
+    """
+
+def project_base_url(project_ref):
+    """API URL prefix for a project"""
+    return f"{API_URL}/projects/{project_ref}"
 
-def file_exists(project_id, file_path):
-    url = f"{API_URL}/projects/{project_id}/repository/files/{requests.utils.quote(file_path, safe='')}"
-    for branch in ['master', 'main']:
-        res = requests.get(url, headers=get_headers(), params={"ref": branch})
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def file_exists(project_ref, file_path, default_branch):
+    """
+    HEAD the file on the project's default branch (no blob payload)
+    Falls back to the other conventional branch only when the first probe 404s
+    Returns (exists, branch the file was found on or None)
+    Raises GitLabAPIError for any other status so the failure is not cached
+    """
+    url = f"{project_base_url(project_ref)}/repository/files/{_urlquote(file_path, safe='')}"
+    branches = [default_branch] if default_branch else []
+    branches += [branch for branch in BRANCHES if branch != default_branch]
+    for branch in branches:
+        try:
+            res = SESSION.head(url, params={"ref": branch}, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            raise GitLabAPIError(f"Could not reach GitLab: {e}") from e
         if res.status_code == 200:
-            return True
-    return False
+            return True, branch
+        if res.status_code != 404:
+            raise GitLabAPIError(f"GitLab returned HTTP {res.status_code}")
+    return False, None
 
-def file_exists_flexible(project_id, file_path):
+def file_variations(file_path):
     """
-    Check if file exists with or without .md extension for flexible files
-    Returns True if file exists in any supported format
+    Return every accepted name for a required file
+    Flexible files may exist with or without .md extension (and as .txt/.rst)
     """
-    if file_exists(project_id, file_path):
-        return True
     base_name = file_path.replace('.md', '')
-    if base_name in FLEXIBLE_EXTENSION_FILES:
-        if file_exists(project_id, base_name):
-            return True
-        variations = [
-            base_name.upper(),
-            base_name.lower(),
-            f"{base_name}.txt",
-            f"{base_name.upper()}.txt",
-            f"{base_name.lower()}.txt",
-            f"{base_name}.rst",
-            f"{base_name.upper()}.rst",
-            f"{base_name.lower()}.rst"
-        ]
-        for variation in variations:
-            if file_exists(project_id, variation):
-                return True
-    return False
-
-def match_template_patterns(filename, patterns):
+    if base_name not in FLEXIBLE_EXTENSION_FILES:
+        return [file_path]
+    return [
+        file_path,
+        base_name,
+        base_name.upper(),
+        base_name.lower(),
+        f"{base_name}.txt",
+        f"{base_name.upper()}.txt",
+        f"{base_name.lower()}.txt",
+        f"{base_name}.rst",
+        f"{base_name.upper()}.rst",
+        f"{base_name.lower()}.rst"
+    ]
+
+def match_template_patterns(filename, compiled_re):
     """
-    Check if filename matches any of the template patterns (case-insensitive)
+    Check if filename matches the compiled template patterns (case-insensitive)
     Only matches files that end with .md
     """
-    if not filename.lower().endswith('.md'):
-        return False
     filename_lower = filename.lower()
-    for pattern in patterns:
-        if re.match(pattern, filename_lower, re.IGNORECASE):
-            return True
-    return False
+    return filename_lower.endswith('.md') and compiled_re.match(filename_lower) is not None
 
-def directory_contains_templates(project_id, template_patterns):
+def gql_query(query, variables=None):
     """
-    Check for any .md file in .gitlab/ directory (or subdirs) matching the given patterns
+    POST a query to the GitLab GraphQL endpoint
+    Returns the `data` payload, or None if the request or query failed
     """
-    tree_url = f"{API_URL}/projects/{project_id}/repository/tree"
-    params = {"path": ".gitlab", "recursive": True, "per_page": 100}
-    res = requests.get(tree_url, headers=get_headers(), params=params)
+    try:
+        res = SESSION.post(GRAPHQL_URL, json={"query": query, "variables": variables or {}}, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        return None
     if res.status_code != 200:
-        return False
-    files = [f["name"] for f in res.json() if f["type"] == "blob"]
-    for filename in files:
-        if match_template_patterns(filename, template_patterns):
+        return None
+    payload = res.json()
+    if payload.get("errors"):
+        return None
+    return payload.get("data")
+
+def directory_contains_templates(template_files, compiled_re):
+    """
+    Check whether any of the .gitlab/ file names matches the compiled patterns
+    """
+    for filename in template_files:
+        if match_template_patterns(filename, compiled_re):
             return True
     return False
 
 def has_profile_readme(username):
-    url = f"{API_URL}/projects/{username}%2F{username}"
-    res = requests.get(url, headers=get_headers())
-    if res.status_code != 200:
-        return False, None
-    project_id = res.json().get("id")
-    readme_exists = file_exists(project_id, "README.md")
-    readme_url = None
-    if readme_exists:
-        if file_exists_with_branch(project_id, "README.md", "main"):
-            readme_url = f"{GITLAB_URL}/{username}/{username}/-/blob/main/README.md"
-        elif file_exists_with_branch(project_id, "README.md", "master"):
-            readme_url = f"{GITLAB_URL}/{username}/{username}/-/blob/master/README.md"
+    # The encoded "username/username" path works as a project ref directly,
+    # so no project lookup is needed (a missing profile repo simply 404s)
+    project_ref = _urlquote(f"{username}/{username}", safe="")
+    # Probe main first so the link prefers it when both branches carry a README
+    readme_exists, branch = file_exists(project_ref, "README.md", "main")
+    readme_url = f"{GITLAB_URL}/{username}/{username}/-/blob/{branch}/README.md" if readme_exists else None
     return readme_exists, readme_url
 
-def file_exists_with_branch(project_id, file_path, branch):
-    """Helper function to check if file exists in specific branch"""
-    url = f"{API_URL}/projects/{project_id}/repository/files/{requests.utils.quote(file_path, safe='')}"
-    res = requests.get(url, headers=get_headers(), params={"ref": branch})
-    return res.status_code == 200
-
-def get_all_projects_with_pagination(params):
+def get_all_projects_with_pagination(projects_url, params):
     """
-    Fetch all projects using pagination to get complete list
+    Fetch all projects from a project-list endpoint using pagination to get complete list
+    Pages after the first are fetched concurrently when GitLab reports X-Total-Pages
+    Raises GitLabAPIError if any later page fails, so a partial list is never returned
     """
-    all_projects = []
-    page = 1
     per_page = 100
-    while True:
+    max_pages = 1000
+
+    def fetch_page(page):
         current_params = params.copy()
         current_params.update({
             "page": page,
             "per_page": per_page
         })
-        projects_url = f"{API_URL}/projects"
-        res = requests.get(projects_url, headers=get_headers(), params=current_params)
-        if res.status_code != 200:
-            break
-        projects = res.json()
-        if not projects:
-            break
-        all_projects.extend(projects)
-        if len(projects) < per_page:
-            break
+        try:
+            return SESSION.get(projects_url, params=current_params, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException:
+            return None
+
+    def fetch_page_projects(page):
+        res = fetch_page(page)
+        if res is None or res.status_code != 200:
+            raise GitLabAPIError(f"Could not fetch page {page} of the project list")
+        return res.json()
+
+    res = fetch_page(1)
+    if res is not None and res.status_code == 404:
+        return []
+    if res is None or res.status_code != 200:
+        raise GitLabAPIError("Could not fetch the project list")
+    all_projects = res.json()
+    total_pages = res.headers.get("X-Total-Pages")
+
+    if total_pages:
+        total_pages = int(total_pages)
+        if total_pages > max_pages:
+            st.warning("⚠️ Reached pagination limit. Some projects might not be displayed.")
+            total_pages = max_pages
+        if total_pages > 1:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                # map() yields results in page order
+                for projects in executor.map(fetch_page_projects, range(2, total_pages + 1)):
+                    all_projects.extend(projects)
+        return all_projects
+
+    # No X-Total-Pages (e.g. very large result sets): walk the pages serially
+    page = 1
+    projects = all_projects
+    while projects and len(projects) == per_page:
         page += 1
-        if page > 1000:
+        if page > max_pages:
             st.warning("⚠️ Reached pagination limit. Some projects might not be displayed.")
             break
+        projects = fetch_page_projects(page)
+        all_projects.extend(projects)
     return all_projects
 
+@st.cache_data(ttl=PROJECT_CACHE_TTL, show_spinner=False)
 def get_contributed_projects(username):
-    user_resp = requests.get(f"{API_URL}/users?username={username}", headers=get_headers())
-    if user_resp.status_code != 200 or not user_resp.json():
-        return []
-    user_id = user_resp.json()[0]['id']
+    projects_url = f"{API_URL}/users/{_urlquote(username, safe='')}/projects"
+    # simple=true returns the trimmed project representation, which still
+    # carries every field the UI reads (name, id, stars, forks, activity, URLs)
     params = {
-        "membership": True,
-        "order_by": "last_activity_at"
+        "order_by": "last_activity_at",
+        "simple": True
     }
-    return get_all_projects_with_pagination(params)
+    return get_all_projects_with_pagination(projects_url, params)
 
-def get_project_by_id_or_url(project_input):
+def get_project_ref(project_input):
+    """
+    Turn a project ID or project URL into a ref usable in any /projects/{ref} endpoint:
+    the numeric ID as-is, or the URL-encoded full path (no ID lookup needed)
+    """
     if project_input.isdigit():
-        res = requests.get(f"{API_URL}/projects/{project_input}", headers=get_headers())
-        return res.json() if res.status_code == 200 else None
-    elif GITLAB_URL in project_input:
+        return project_input
+    if GITLAB_URL in project_input:
         path = project_input.replace(f"{GITLAB_URL}/", "").split("/-/")[0]
-        encoded = requests.utils.quote(path, safe="")
-        res = requests.get(f"{API_URL}/projects/{encoded}", headers=get_headers())
-        if res.status_code == 200:
-            return res.json()
+        return _urlquote(path, safe="")
     return None
 
+@st.cache_data(ttl=PROJECT_CACHE_TTL, show_spinner=False)
+def get_project_by_id_or_url(project_input):
+    """
+    Fetch a project by ID or URL; returns None if GitLab has no such project
+    Raises GitLabAPIError on any other failure so it is not cached
+    """
+    project_ref = get_project_ref(project_input)
+    if not project_ref:
+        return None
+    try:
+        res = SESSION.get(project_base_url(project_ref), timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        raise GitLabAPIError(f"Could not reach GitLab: {e}") from e
+    if res.status_code == 404:
+        return None
+    if res.status_code != 200:
+        raise GitLabAPIError(f"GitLab returned HTTP {res.status_code}")
+    return res.json()
+
 def determine_input_type_and_process(input_value):
     """
     Determine the type of input and return appropriate:
@@ -184,7 +294,10 @@ def determine_input_type_and_process(input_value):
 
     # Check for project URL
     if GITLAB_URL in input_value:
-        project = get_project_by_id_or_url(input_value)
+        try:
+            project = get_project_by_id_or_url(input_value)
+        except GitLabAPIError as e:
+            return ('error', str(e))
         if project:
             return ('project', project)
         else:
@@ -192,7 +305,10 @@ def determine_input_type_and_process(input_value):
 
     # Numeric input → treated ONLY as Project ID (not user ID)
     elif input_value.isdigit():
-        project = get_project_by_id_or_url(input_value)
+        try:
+            project = get_project_by_id_or_url(input_value)
+        except GitLabAPIError as e:
+            return ('error', str(e))
         if project:
             return ('project', project)
         else:
@@ -200,33 +316,79 @@ def determine_input_type_and_process(input_value):
 
     # Otherwise, treat as username
     else:
-        projects = get_contributed_projects(input_value)
+        try:
+            projects = get_contributed_projects(input_value)
+        except GitLabAPIError as e:
+            return ('error', str(e))
         if projects:
             return ('projects', projects)
         else:
             return ('error', f"No projects found for username: {input_value}")
 
-def get_compliance_status(project_id):
+def get_compliance_status(project):
+    """
+    Build the compliance status for a project dict
+    """
+    return fetch_compliance_status(project["path_with_namespace"])
+
+def get_repo_paths(repository):
+    """
+    Flatten the repository part of the compliance query into one set of blob paths
+    (existing candidate root files plus everything under .gitlab/)
+    """
+    files = (repository.get("files") or {}).get("nodes", [])
+    templates = ((repository.get("templates") or {}).get("blobs") or {}).get("nodes", [])
+    return {blob["path"] for blob in files + templates}
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_compliance_status(project_path):
+    """
+    Query the compliance state of a project with a single GraphQL query
+    Cached per project path for CACHE_TTL seconds
+    Raises GitLabAPIError if the project could not be queried, so the failure is not cached
+    """
+    candidates = {file: file_variations(file) for file in REQUIRED_FILES}
+    paths = [path for variations in candidates.values() for path in variations]
+    data = gql_query(COMPLIANCE_QUERY, {"fullPath": project_path, "paths": paths})
+    gl_project = (data or {}).get("project")
+    if not gl_project:
+        raise GitLabAPIError("Failed to fetch compliance info.")
+
+    repo_paths = get_repo_paths(gl_project.get("repository") or {})
+    template_files = [path.rsplit("/", 1)[-1] for path in repo_paths if path.startswith(".gitlab/")]
+
+    # Everything below is answered in memory from the one path set
     status = {}
-    for file in REQUIRED_FILES:
-        if file.replace('.md', '') in FLEXIBLE_EXTENSION_FILES:
-            status[file] = file_exists_flexible(project_id, file)
-        else:
-            status[file] = file_exists(project_id, file)
-    status[".gitlab/issue_templates"] = directory_contains_templates(project_id, ISSUE_TEMPLATE_PATTERNS)
-    status[".gitlab/merge_request_templates"] = directory_contains_templates(project_id, MR_TEMPLATE_PATTERNS)
-    res = requests.get(f"{API_URL}/projects/{project_id}", headers=get_headers())
-    if res.status_code != 200:
-        return {}
-    project = res.json()
-    status['description_present'] = bool(project.get("description"))
-    status['tags_present'] = bool(project.get("tag_list")) and len(project.get("tag_list")) > 0
+    for file, variations in candidates.items():
+        status[file] = any(variation in repo_paths for variation in variations)
+    status[".gitlab/issue_templates"] = directory_contains_templates(template_files, ISSUE_RE)
+    status[".gitlab/merge_request_templates"] = directory_contains_templates(template_files, MR_RE)
+    status['description_present'] = bool(gl_project.get("description"))
+    status['tags_present'] = bool(gl_project.get("topics"))
     return status
 
 def get_project_url(project_data):
     """Generate the web URL for the project"""
     return project_data.get('web_url', f"{GITLAB_URL}/{project_data.get('path_with_namespace', '')}")
 
+# === 🎨 Styles ===
+COMPLIANCE_CSS = """
+<style>
+.compliance-container {
+    background-color: #f0f7ff;
+    padding: 16px;
+    border-radius: 8px;
+    border-left: 5px solid #357edd;
+}
+.compliance-category {
+    font-weight: bold;
+    color: #0a4d8c;
+    margin-top: 10px;
+    margin-bottom: 6px;
+}
+</style>
+"""
+
 # === 🎯 UI ===
 st.set_page_config(page_title="GitLab Self-Check App", layout="wide")
 st.sidebar.title("🔍 GitLab Checker")
@@ -241,13 +403,17 @@ if choice == "Check Profile README":
         if not username:
             st.warning("Please enter a username.")
         else:
-            readme_exists, readme_url = has_profile_readme(username)
-            if readme_exists:
-                st.success("✅ README.md is present in the profile repo.")
-                if readme_url:
-                    st.markdown(f"[🔗 View README]({readme_url})")
+            try:
+                readme_exists, readme_url = has_profile_readme(username)
+            except GitLabAPIError as e:
+                st.error(f"❌ Could not check the profile README: {e}")
             else:
-                st.error("❌ README.md is missing in the profile repo.")
+                if readme_exists:
+                    st.success("✅ README.md is present in the profile repo.")
+                    if readme_url:
+                        st.markdown(f"[🔗 View README]({readme_url})")
+                else:
+                    st.error("❌ README.md is missing in the profile repo.")
 
 # === 2. Project Compliance Check ===
 elif choice == "Project Compliance Check":
@@ -279,11 +445,11 @@ elif choice == "Project Compliance Check":
                 selected_project = next(p for p in projects_list if f"{p['name_with_namespace']} ({p['id']})" == selected)
 
     if selected_project and st.button("Check Compliance"):
-        project_id = selected_project["id"]
         project_url = get_project_url(selected_project)
-        status = get_compliance_status(project_id)
-        if not status:
-            st.error("Failed to fetch compliance info.")
+        try:
+            status = get_compliance_status(selected_project)
+        except GitLabAPIError as e:
+            st.error(f"❌ {e}")
         else:
             st.markdown("### 🔗 Project Information")
             col1, col2 = st.columns([3, 1])
@@ -301,7 +467,17 @@ elif choice == "Project Compliance Check":
                 st.metric("📅 Last Activity", selected_project.get('last_activity_at', 'Unknown')[:10])
 
             st.markdown("---")
-            score = sum(1 for present in status.values() if present)
+            # Single pass: score plus the per-category buckets used below
+            score = 0
+            file_items, template_items, metadata_items = {}, {}, {}
+            for item, present in status.items():
+                score += present
+                if item in FILE_SET:
+                    file_items[item] = present
+                elif ".gitlab/" in item:
+                    template_items[item] = present
+                else:
+                    metadata_items[item] = present
             total = len(status)
             progress_percentage = score / total
 
@@ -326,59 +502,32 @@ elif choice == "Project Compliance Check":
 
             # Styled Detailed Compliance Check
             st.markdown("### 📋 Detailed Compliance Check")
-            st.markdown("""
-                <style>
-                .compliance-container {
-                    background-color: #f0f7ff;
-                    padding: 16px;
-                    border-radius: 8px;
-                    border-left: 5px solid #357edd;
-                }
-                .compliance-category {
-                    font-weight: bold;
-                    color: #0a4d8c;
-                    margin-top: 10px;
-                    margin-bottom: 6px;
-                }
-                </style>
-            """, unsafe_allow_html=True)
-            st.markdown('<div class="compliance-container">', unsafe_allow_html=True)
-
-            file_items = {k: v for k, v in status.items() if k in REQUIRED_FILES or k == "CHANGELOG.md"}
-            template_items = {k: v for k, v in status.items() if ".gitlab/" in k}
-            metadata_items = {k: v for k, v in status.items() if "present" in k}
+            html = [COMPLIANCE_CSS, '<div class="compliance-container">']
 
             if file_items:
-                st.markdown('<p class="compliance-category">📄 Required Files</p>', unsafe_allow_html=True)
+                html.append('<p class="compliance-category">📄 Required Files</p>')
                 for item, present in file_items.items():
                     emoji = "✅" if present else "❌"
-                    display_name = item.replace('_', ' ').replace('.md', '.md')
-                    if present:
-                        st.markdown(f"{emoji} **{display_name}**")
-                    else:
-                        st.markdown(f"{emoji} **{display_name}**")
+                    display_name = item.replace('_', ' ')
+                    html.append(f"<div>{emoji} <b>{display_name}</b></div>")
 
             if template_items:
-                st.markdown('<p class="compliance-category">📝 GitLab Templates</p>', unsafe_allow_html=True)
+                html.append('<p class="compliance-category">📝 GitLab Templates</p>')
                 for item, present in template_items.items():
                     emoji = "✅" if present else "❌"
                     display_name = item.replace('_', ' ').replace('.gitlab/', '').title()
-                    if present:
-                        st.markdown(f"{emoji} **{display_name}**")
-                    else:
-                        st.markdown(f"{emoji} **{display_name}**")
+                    html.append(f"<div>{emoji} <b>{display_name}</b></div>")
 
             if metadata_items:
-                st.markdown('<p class="compliance-category">ℹ️ Project Metadata</p>', unsafe_allow_html=True)
+                html.append('<p class="compliance-category">ℹ️ Project Metadata</p>')
                 for item, present in metadata_items.items():
                     emoji = "✅" if present else "❌"
                     display_name = item.replace('_', ' ').title()
-                    if present:
-                        st.markdown(f"{emoji} **{display_name}**")
-                    else:
-                        st.markdown(f"{emoji} **{display_name}**")
+                    html.append(f"<div>{emoji} <b>{display_name}</b></div>")
 
-            st.markdown('</div>', unsafe_allow_html=True)
+            html.append('</div>')
+            # One frontend message for the whole section instead of one per item
+            st.markdown("".join(html), unsafe_allow_html=True)
 
     elif not input_value:
         st.info("💡 Enter a username, project ID, or project URL above to get started.")
\ No newline at end of file